@@ -1,21 +1,33 @@
 import functools
 import logging
 import traceback
-from dataclasses import dataclass
-from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
-from PyQt5 import QtCore, QtGui, QtWidgets, uic
+from PyQt5 import QtCore, QtWidgets, sip, uic
 from PyQt5.QtCore import Qt, pyqtSlot
 from PyQt5.QtWidgets import QFileDialog, QInputDialog, QLineEdit
 
 from forms import error_dialog, strings
+from forms.tunnel_task import TunnelTask, TunnelTaskSignals
 from forms.tunnel_ui import TunnelUI
+from forms.tunnels_model import TunnelsModel
+from src.encryption import clear_key_cache, new_salt
 from src.SSHTunnel import SSHTunnel, load_tunnels, save_tunnels
 
 logger = logging.getLogger(__name__)
 
+# Starting a tunnel mostly waits on the network, so run more tasks at once
+# than there are CPU cores to bring all the tunnels up in parallel
+MAX_TUNNEL_THREADS = 32
+
+# Time to wait on exit for the tunnels that are still being started or
+# stopped, an SSH handshake may take much longer to time out
+EXIT_TIMEOUT_MS = 3000
+
+# Compile the QT ".ui" file once, instead of parsing it for every window
+_FORM_CLASS, _BASE_CLASS = uic.loadUiType(Path(__file__).parent / "main.ui")
+
 
 def log_errors(func):
     @functools.wraps(func)
@@ -30,23 +42,24 @@ def log_errors(func):
     return wrapper
 
 
-@dataclass
-class TunnelItem:
-    tunnel: SSHTunnel
-    check_box: QtWidgets.QCheckBox
-
-
-class MainUI(QtWidgets.QMainWindow):
+class MainUI(_BASE_CLASS, _FORM_CLASS):
 
-    def __init__(self, form_path: Path):
-        """Run the main user interface.
-
-        Args:
-            form_path (Path): Path to the QT ".ui" file.
-        """
+    def __init__(self):
+        """Run the main user interface."""
         super().__init__()
-        uic.loadUi(form_path, self)
-        self._tunnels_items: List[TunnelItem] = []
+        self.setupUi(self)
+        self._tunnels_items: List[SSHTunnel] = []
+        # Tunnels with a start (True) or stop (False) task in progress, and
+        # the task to run on each of them once it finishes
+        self._busy_tunnels: Dict[SSHTunnel, bool] = {}
+        self._queued_tasks: Dict[SSHTunnel, bool] = {}
+        # Edited parameters to apply once the tunnel has been stopped
+        self._pending_edits: Dict[SSHTunnel, SSHTunnel] = {}
+        # The salt is kept while the password does not change, so the derived
+        # key is cached and saving again is fast
+        self._last_password: str = None
+        self._last_salt: bytes = None
+        self._is_shut_down = False
         self._init_widgets()
         self._bind()
         self.show()
@@ -54,20 +67,23 @@ class MainUI(QtWidgets.QMainWindow):
     def _init_widgets(self):
         """Initialize the QT widgets.
         """
-        self.tree_model = QtGui.QStandardItemModel()
-        self.tree_model.setHorizontalHeaderLabels([
-            strings.TOGGLE,
-            strings.NAME,
-            strings.LOCAL_IP,
-            strings.LOCAL_PORT,
-            strings.HOST_IP,
-            strings.HOST_PORT,
-            strings.SSH_IP,
-            strings.SSH_PORT
-        ])
+        self.tree_model = TunnelsModel(self._tunnels_items, self)
+        # Without a parent, so that it is not deleted with the window while
+        # the tasks still hold it
+        self._task_signals = TunnelTaskSignals()
+        # Its lifetime is handled by _shutdown, a child of the window would
+        # wait for every pending handshake when the window is destroyed
+        self._thread_pool = QtCore.QThreadPool()
+        self._thread_pool.setMaxThreadCount(MAX_TUNNEL_THREADS)
         self.treeView.setModel(self.tree_model)
-        self.treeView.header().resizeSection(0, 60)
-        self.tree_root = self.tree_model.invisibleRootItem()
+        # All the rows have the same content, so let the view measure
+        # only one of them
+        self.treeView.setUniformRowHeights(True)
+        self.treeView.setAlternatingRowColors(False)
+        self.treeView.setRootIsDecorated(False)
+        header = self.treeView.header()
+        header.setSectionResizeMode(0, QtWidgets.QHeaderView.Fixed)
+        header.resizeSection(0, 60)
 
     def _bind(self):
         """Bind widgets to functions.
@@ -83,95 +99,72 @@ class MainUI(QtWidgets.QMainWindow):
         self.actionExit.triggered.connect(self._on_action_exit)
         self.treeView.keyPressEvent = self._on_tree_key_press
         self.treeView.doubleClicked.connect(self._on_tree_double_clicked)
+        self.tree_model.toggle_requested.connect(self._toggle_tunnel)
+        self._task_signals.finished.connect(self._on_tunnel_task_finished)
 
+    @pyqtSlot(int, bool)
     @log_errors
-    def _add_tree_item(self, tunnel: SSHTunnel) -> QtWidgets.QCheckBox:
-        """Add a new row on the tunnels treeView.
+    def _toggle_tunnel(self, row: int, value: bool):
+        """Toggle a tunnel.
 
         Args:
-            tunnel (SSHTunnel): A SSHTunnel object.
-
-        Returns:
-            QtWidgets.QCheckBox: The associated toggle check box.
+            row (int): The row of the tunnel to toggle.
+            value (bool): The new value of the checkBox
         """
-        buttonItem = QtGui.QStandardItem("")
-        name_item = QtGui.QStandardItem(tunnel.name)
-        local_ip_item = QtGui.QStandardItem(tunnel.local_ip)
-        local_port_item = QtGui.QStandardItem(str(tunnel.local_port))
-        host_ip_item = QtGui.QStandardItem(tunnel.host_ip)
-        host_port_item = QtGui.QStandardItem(str(tunnel.host_port))
-        server_ip_item = QtGui.QStandardItem(tunnel.server_ip)
-        server_port_item = QtGui.QStandardItem(str(tunnel.server_port))
-
-        name_item.setEditable(False)
-        local_ip_item.setEditable(False)
-        local_port_item.setEditable(False)
-        host_ip_item.setEditable(False)
-        host_port_item.setEditable(False)
-        server_ip_item.setEditable(False)
-        server_port_item.setEditable(False)
-
-        self.tree_root.appendRow([
-            buttonItem,
-            name_item,
-            local_ip_item,
-            local_port_item,
-            host_ip_item,
-            host_port_item,
-            server_ip_item,
-            server_port_item
-        ])
-        button = QtWidgets.QCheckBox()
-        button.clicked.connect(partial(self._toggle_tunnel, tunnel, button))
-        self.treeView.setIndexWidget(buttonItem.index(), button)
-        return button
-    
-    @log_errors
-    def _toggle_tunnel(
-        self,
-        tunnel: SSHTunnel,
-        checkBox: QtWidgets.QCheckBox,
-        value: bool
-    ):
-        """Toggle a tunnel.
+        tunnel = self._tunnels_items[row]
+        # Ignore the clicks while the tunnel is being started or stopped
+        if tunnel not in self._busy_tunnels and value != tunnel.is_active():
+            self._run_tunnel_task(tunnel, value)
+        else:
+            self.tree_model.refresh_row(row)
+
+    def _run_tunnel_task(self, tunnel: SSHTunnel, start: bool):
+        """Start or stop a tunnel on the tunnels thread pool.
+
+        If the tunnel already has a task in progress, the new one is queued
+        and run when the current one finishes. Only the last queued task is
+        kept, and a task that does the same as the running one is dropped.
 
         Args:
-            tunnel (SSHTunnel): The tunnel to toggle.
-            checkBox (QtWidgets.QCheckBox): The checkBox associated to the
-                tunnel.
-            value (bool): The new value of the checkBox
+            tunnel (SSHTunnel): The tunnel to start or stop.
+            start (bool): True to start the tunnel, False to stop it.
         """
-        try:
-            if value:
-                if not tunnel.is_active():
-                    tunnel.start()
+        running = self._busy_tunnels.get(tunnel)
+        if running is not None:
+            if start == running:
+                self._queued_tasks.pop(tunnel, None)
             else:
-                if tunnel.is_active():
-                    tunnel.stop()
-        except Exception as e:
-            error_dialog.show_error(f"{tunnel.name}: {e}")
-        checkBox.setChecked(tunnel.is_active())
+                self._queued_tasks[tunnel] = start
+            return
+        self._busy_tunnels[tunnel] = start
+        task = TunnelTask(tunnel, start, self._task_signals)
+        self._thread_pool.start(task)
 
+    @pyqtSlot(object, object)
     @log_errors
-    def _edit_tree_item(self, indexes: list, tunnel: SSHTunnel):
-        """Edit a tunnel tree item.
+    def _on_tunnel_task_finished(self, tunnel: SSHTunnel, error: Exception):
+        """Update the tree after a tunnel has been started or stopped.
 
         Args:
-            indexes (list): Tree column indexes to edit.
-            tunnel (SSHTunnel): The SSHTunnel object that will be used to
-                update the tree item.
+            tunnel (SSHTunnel): The started or stopped tunnel.
+            error (Exception): The raised exception, or None.
         """
-        values = [
-            tunnel.name,
-            tunnel.local_ip,
-            str(tunnel.local_port),
-            tunnel.host_ip,
-            str(tunnel.host_port),
-            tunnel.server_ip,
-            str(tunnel.server_port)
-        ]
-        for i, v in zip(indexes[1:], values):
-            self.tree_model.itemFromIndex(i).setText(v)
+        self._busy_tunnels.pop(tunnel, None)
+        edited = self._pending_edits.pop(tunnel, None)
+        if edited is not None:
+            for name, value in edited.to_dict().items():
+                setattr(tunnel, name, value)
+        start = self._queued_tasks.pop(tunnel, None)
+        if start is not None and start != tunnel.is_active():
+            self._run_tunnel_task(tunnel, start)
+
+        if not self.tree_model.refresh_tunnel(tunnel):
+            # The tunnel has been deleted in the meantime
+            if error is not None:
+                logger.warning(f"{tunnel.name}: {error}")
+            return
+        if error is not None:
+            error_dialog.show_error(f"{tunnel.name}: {error}")
 
     @log_errors
     def _ui_edit_tunnel_row(self, indexes: List[QtCore.QModelIndex]):
@@ -180,15 +173,17 @@ class MainUI(QtWidgets.QMainWindow):
         Args:
             indexes (List[QtCore.QModelIndex]): The indexes of the row to edit.
         """
-        row = self.tree_model.itemFromIndex(indexes[0]).row()
-        tunnel = self._tunnels_items[row].tunnel
-        check_box = self._tunnels_items[row].check_box
+        row = indexes[0].row()
+        tunnel = self._tunnels_items[row]
         ui = TunnelUI(tunnel)
         if ui.exec():
-            tunnel.stop()
-            ui.update_tunnel()
-            self._edit_tree_item(indexes, tunnel)
-            check_box.setChecked(tunnel.is_active())
+            # The worker reads the parameters while it starts or stops
+            if tunnel in self._busy_tunnels:
+                error_dialog.show_error(f"{tunnel.name}: {strings.TUNNEL_BUSY}")
+                return
+            # Stop the tunnel and apply the changes when it has finished
+            self._pending_edits[tunnel] = ui.get_tunnel()
+            self._run_tunnel_task(tunnel, False)
     
     @log_errors
     def _ui_duplicate_tunnel_row(self, indexes: List[QtCore.QModelIndex]):
@@ -198,13 +193,12 @@ class MainUI(QtWidgets.QMainWindow):
             indexes (List[QtCore.QModelIndex]): The indexes of the row to
                 duplicate.
         """
-        row = self.tree_model.itemFromIndex(indexes[0]).row()
-        tunnel = self._tunnels_items[row].tunnel
+        row = indexes[0].row()
+        tunnel = self._tunnels_items[row]
         ui = TunnelUI(tunnel)
         if ui.exec():
             tunnel = ui.get_tunnel()
-            check_box = self._add_tree_item(tunnel)
-            self._tunnels_items.append(TunnelItem(tunnel, check_box))
+            self._add_tunnel(tunnel)
 
     @log_errors
     def _delete_tunnel_row(self, indexes: List[QtCore.QModelIndex]):
@@ -214,10 +208,9 @@ class MainUI(QtWidgets.QMainWindow):
             indexes (List[QtCore.QModelIndex]): The indexes of the row to
                 delete.
         """
-        index = self.tree_model.itemFromIndex(indexes[0]).row()
-        self.tree_model.takeRow(index)
-        self._tunnels_items[index].tunnel.stop()
-        del (self._tunnels_items[index])
+        row = indexes[0].row()
+        tunnel = self.tree_model.remove_tunnel(row)
+        self._run_tunnel_task(tunnel, False)
 
     @pyqtSlot()
     @log_errors
@@ -235,9 +228,8 @@ class MainUI(QtWidgets.QMainWindow):
 
     @log_errors
     def _add_tunnel(self, tunnel: SSHTunnel):
-        check_box = self._add_tree_item(tunnel)
-        self._tunnels_items.append(TunnelItem(tunnel, check_box))
-        
+        self.tree_model.append_tunnel(tunnel)
+
     @pyqtSlot()
     @log_errors
     def _on_add_button_click(self):
@@ -270,22 +262,14 @@ class MainUI(QtWidgets.QMainWindow):
     @pyqtSlot()
     @log_errors
     def _on_start_all_button_click(self):
-        for tunnel_item in self._tunnels_items:
-            try:
-                tunnel_item.tunnel.start()
-            except Exception as e:
-                error_dialog.show_error(f"{tunnel_item.tunnel.name}: {e}")
-            tunnel_item.check_box.setChecked(tunnel_item.tunnel.is_active())
+        for tunnel in self._tunnels_items:
+            self._run_tunnel_task(tunnel, True)
 
     @pyqtSlot()
     @log_errors
     def _on_stop_all_button_click(self):
-        for tunnel_item in self._tunnels_items:
-            try:
-                tunnel_item.tunnel.stop()
-            except Exception as e:
-                error_dialog.show_error(f"{tunnel_item.tunnel.name}: {e}")
-            tunnel_item.check_box.setChecked(tunnel_item.tunnel.is_active())
+        for tunnel in self._tunnels_items:
+            self._run_tunnel_task(tunnel, False)
 
     @pyqtSlot()
     @log_errors
@@ -302,10 +286,14 @@ class MainUI(QtWidgets.QMainWindow):
             options=options
         )
         if file_name:
+            if password != self._last_password:
+                self._last_password = password
+                self._last_salt = new_salt()
             save_tunnels(
-                [i.tunnel for i in self._tunnels_items],
+                self._tunnels_items,
                 Path(file_name),
-                password
+                password,
+                self._last_salt
             )
 
     @pyqtSlot()
@@ -324,29 +312,60 @@ class MainUI(QtWidgets.QMainWindow):
             if password is None:
                 return
 
-            # Stop current tunnels
-            for tunnel_item in self._tunnels_items:
-                try:
-                    tunnel_item.tunnel.stop()
-                except:
-                    pass
-            
-            # Delete tunnels
-            self.tree_model.removeRows(0, self.tree_model.rowCount())
-            self._tunnels_items = []
+            # Replace the tunnels with the loaded ones
+            tunnels = load_tunnels(Path(file_name), password)
+            old_tunnels = list(self._tunnels_items)
             self.treeView.clearSelection()
+            self.tree_model.set_tunnels(tunnels)
 
-            # Load tunnels
-            tunnels = load_tunnels(Path(file_name), password)
-            for t in tunnels:
-                self._add_tunnel(t)
+            # Stop the previous tunnels
+            for tunnel in old_tunnels:
+                self._run_tunnel_task(tunnel, False)
 
     @pyqtSlot()
     @log_errors
     def _on_action_exit(self):
-        self._on_stop_all_button_click()
+        self.close()
         QtCore.QCoreApplication.quit()
 
+    def closeEvent(self, event):
+        self._shutdown()
+        super().closeEvent(event)
+
+    @log_errors
+    def _shutdown(self):
+        """Stop all the tunnels before the window is closed.
+        """
+        if self._is_shut_down:
+            return
+        self._is_shut_down = True
+        self._task_signals.finished.disconnect(self._on_tunnel_task_finished)
+
+        # Wait a bit for the running tasks and stop the tunnels right away,
+        # the event loop will not deliver any more task results. The busy
+        # tunnels may have been deleted or replaced by a load.
+        self.hide()
+        # Drop the tasks that have not started yet, so they do not open any
+        # tunnel after the ones below have been stopped
+        self._thread_pool.clear()
+        if not self._thread_pool.waitForDone(EXIT_TIMEOUT_MS):
+            # Give up on the handshakes that are still running: hand the pool
+            # to C++ so that its destructor, which waits for them, never runs
+            logger.warning("Exiting with tunnels still being started")
+            sip.transferto(self._thread_pool, None)
+        tunnels = {
+            **dict.fromkeys(self._tunnels_items),
+            **dict.fromkeys(self._busy_tunnels),
+            **dict.fromkeys(self._queued_tasks),
+        }
+        for tunnel in tunnels:
+            try:
+                tunnel.stop()
+            except Exception as e:
+                logger.error(f"{tunnel.name}: {e}")
+        self._last_password = None
+        clear_key_cache()
+
     @log_errors
     def _show_password_dialog(self):
         password, ok = QInputDialog.getText(
@@ -10,3 +10,5 @@ SSH_IP = "SSH Server IP"
 SSH_PORT = "SSH Server Port"
 NEW_TUNNEL = "New tunnel"
 EDIT_TUNNEL = "Edit"
+
+TUNNEL_BUSY = "The tunnel is being started or stopped, try again later."
@@ -0,0 +1,51 @@
+from PyQt5 import QtCore
+
+from src.SSHTunnel import SSHTunnel
+
+
+class TunnelTaskSignals(QtCore.QObject):
+
+    # Emitted with the tunnel and the raised exception, or None
+    finished = QtCore.pyqtSignal(object, object)
+
+
+class TunnelTask(QtCore.QRunnable):
+
+    def __init__(
+        self,
+        tunnel: SSHTunnel,
+        start: bool,
+        signals: TunnelTaskSignals
+    ):
+        """Start or stop a tunnel on a worker thread.
+
+        The ``signals.finished`` signal is emitted when the task ends. It is
+        delivered on the thread of the receiver, so the slot can update the
+        widgets. The same signals object can be shared by many tasks; it
+        should not have a parent, so that the tasks keep it alive.
+
+        Args:
+            tunnel (SSHTunnel): The tunnel to start or stop.
+            start (bool): True to start the tunnel, False to stop it.
+            signals (TunnelTaskSignals): The signals used to report the
+                result.
+        """
+        super().__init__()
+        self.tunnel = tunnel
+        self.start_tunnel = start
+        self.signals = signals
+
+    def run(self):
+        error = None
+        try:
+            if self.start_tunnel:
+                self.tunnel.start()
+            else:
+                self.tunnel.stop()
+        except Exception as e:
+            error = e
+        try:
+            self.signals.finished.emit(self.tunnel, error)
+        except RuntimeError:
+            # The receiver has been closed while the task was running
+            pass
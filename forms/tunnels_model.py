@@ -0,0 +1,170 @@
+from typing import Any, List
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+
+from forms import strings
+from src.SSHTunnel import SSHTunnel
+
+_HEADERS = (
+    strings.TOGGLE,
+    strings.NAME,
+    strings.LOCAL_IP,
+    strings.LOCAL_PORT,
+    strings.HOST_IP,
+    strings.HOST_PORT,
+    strings.SSH_IP,
+    strings.SSH_PORT
+)
+
+# Tunnel attribute shown on each column, the first one is the toggle
+_COLUMN_ATTRIBUTES = (
+    None,
+    "name",
+    "local_ip",
+    "local_port",
+    "host_ip",
+    "host_port",
+    "server_ip",
+    "server_port"
+)
+
+_READONLY_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+_TOGGLE_FLAGS = _READONLY_FLAGS | Qt.ItemIsUserCheckable
+
+
+class TunnelsModel(QtCore.QAbstractTableModel):
+
+    toggle_requested = QtCore.pyqtSignal(int, bool)
+
+    def __init__(self, tunnels: List[SSHTunnel], parent=None):
+        """Table model that exposes a list of tunnels to a QT view.
+
+        The model does not copy the tunnels, it reads them from the given list
+        every time the view asks for data. The first column shows a check box
+        with the state of the tunnel; toggling it emits ``toggle_requested``
+        instead of changing the tunnel directly.
+
+        Args:
+            tunnels (List[SSHTunnel]): The list of tunnels to show.
+            parent (QtCore.QObject, optional): Parent object. Defaults to None.
+        """
+        super().__init__(parent)
+        self._tunnels = tunnels
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._tunnels)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(_HEADERS)
+
+    def data(self, index: QtCore.QModelIndex, role=Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            attribute = _COLUMN_ATTRIBUTES[column]
+            if attribute is None:
+                return None
+            return str(getattr(self._tunnels[index.row()], attribute))
+        if role == Qt.CheckStateRole and column == 0:
+            tunnel = self._tunnels[index.row()]
+            return Qt.Checked if tunnel.is_active() else Qt.Unchecked
+        return None
+
+    def setData(
+        self,
+        index: QtCore.QModelIndex,
+        value: Any,
+        role=Qt.EditRole
+    ) -> bool:
+        if (
+            not index.isValid()
+            or index.column() != 0
+            or role != Qt.CheckStateRole
+        ):
+            return False
+        self.toggle_requested.emit(index.row(), value == Qt.Checked)
+        return True
+
+    def flags(self, index: QtCore.QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() == 0:
+            return _TOGGLE_FLAGS
+        return _READONLY_FLAGS
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role=Qt.DisplayRole
+    ) -> Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return _HEADERS[section]
+        return None
+
+    def append_tunnel(self, tunnel: SSHTunnel):
+        """Append a tunnel at the end of the list.
+
+        Args:
+            tunnel (SSHTunnel): The tunnel to add.
+        """
+        row = len(self._tunnels)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._tunnels.append(tunnel)
+        self.endInsertRows()
+
+    def remove_tunnel(self, row: int) -> SSHTunnel:
+        """Remove the tunnel of a row.
+
+        Args:
+            row (int): The row to remove.
+
+        Returns:
+            SSHTunnel: The removed tunnel.
+        """
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        tunnel = self._tunnels.pop(row)
+        self.endRemoveRows()
+        return tunnel
+
+    def refresh_row(self, row: int):
+        """Notify the view that the tunnel of a row has changed.
+
+        Args:
+            row (int): The row to refresh.
+        """
+        self.dataChanged.emit(
+            self.index(row, 0),
+            self.index(row, self.columnCount() - 1)
+        )
+
+    def set_tunnels(self, tunnels: List[SSHTunnel]):
+        """Replace all the tunnels with a single model reset.
+
+        Args:
+            tunnels (List[SSHTunnel]): The new tunnels.
+        """
+        self.beginResetModel()
+        self._tunnels[:] = tunnels
+        self.endResetModel()
+
+    def refresh_tunnel(self, tunnel: SSHTunnel) -> bool:
+        """Notify the view that a tunnel has changed.
+
+        Args:
+            tunnel (SSHTunnel): The tunnel that has changed.
+
+        Returns:
+            bool: False if the tunnel is not in the model.
+        """
+        for row, t in enumerate(self._tunnels):
+            if t is tunnel:
+                self.refresh_row(row)
+                return True
+        return False
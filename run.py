@@ -2,14 +2,13 @@ import argparse
 import logging
 import os
 import sys
-from pathlib import Path
 
 from PyQt5 import QtWidgets
 
 from forms.main_ui import MainUI
 
 
-def run(form_path: Path, dark_style: bool = False):
+def run(dark_style: bool = False):
     os.environ["QT_API"] = "pyqt5"
     app = QtWidgets.QApplication(sys.argv)
 
@@ -17,7 +16,7 @@ def run(form_path: Path, dark_style: bool = False):
         import qdarkstyle
         app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
 
-    window = MainUI(form_path)
+    window = MainUI()
     app.exec_()
 
 
@@ -42,7 +41,4 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
 
-    run(
-        form_path=Path(__file__).parent / "./forms/main.ui",
-        dark_style=args.dark_style
-    )
+    run(dark_style=args.dark_style)
@@ -1,65 +1,82 @@
 import json
 import logging
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 
-from sshtunnel import SSHTunnelForwarder
+# sshtunnel (paramiko) and cryptography are slow to import, so they are
+# imported when first needed to let the window show up sooner
+if TYPE_CHECKING:
+    from sshtunnel import SSHTunnelForwarder
 
-from .encryption import decrypt, encrypt
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 
+def _json_dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@dataclass(slots=True, eq=False, repr=False)
 class SSHTunnel:
+    """An SSH tunnel.
 
-    def __init__(
-        self,
-        local_port: int,
-        host_ip: str,
-        host_port: int,
-        user: str,
-        password: str,
-        name: str = "",
-        local_ip: str = "127.0.0.1",
-        server_ip: str = None,
-        server_port: int = 22
-    ):
-        """Create an SSH tunnel.
-
-        Args:
-            local_port (int): The local port number to listen on for incoming
-                connections.
-            host_ip (str): The IP address of the remote host to connect to.
-            host_port (int): The port number on the remote host to connect to.
-            user (str): The username for SSH authentication on the remote server.
-            password (str): The password for SSH authentication on the remote server.
-            name (str, optional): An optional name for the tunnel instance.
-                Defaults to "".
-            local_ip (str, optional): The local IP address to bind the tunnel to.
-                Defaults to "127.0.0.1".
-            server_ip (str, optional): The IP address of the SSH server.
-                If None, uses the host_ip. Defaults to None.
-            server_port (int, optional): The port number of the SSH server.
-                Defaults to 22.
-        """
-        self.name = name
-        self.local_ip = local_ip
-        self.local_port = local_port
-        self.host_ip = host_ip
-        self.host_port = host_port
-        self.server_port = server_port
-        self.user = user
-        self.password = password
-        self.server_ip = host_ip if not server_ip else server_ip
-        self._tunnel: SSHTunnelForwarder = None
+    Tunnels are compared by identity, so that two tunnels with the same
+    parameters can be told apart.
+
+    Args:
+        local_port (int): The local port number to listen on for incoming
+            connections.
+        host_ip (str): The IP address of the remote host to connect to.
+        host_port (int): The port number on the remote host to connect to.
+        user (str): The username for SSH authentication on the remote server.
+        password (str): The password for SSH authentication on the remote server.
+        name (str, optional): An optional name for the tunnel instance.
+            Defaults to "".
+        local_ip (str, optional): The local IP address to bind the tunnel to.
+            Defaults to "127.0.0.1".
+        server_ip (str, optional): The IP address of the SSH server.
+            If None, uses the host_ip. Defaults to None.
+        server_port (int, optional): The port number of the SSH server.
+            Defaults to 22.
+    """
+    local_port: int
+    host_ip: str
+    host_port: int
+    user: str
+    password: str
+    name: str = ""
+    local_ip: str = "127.0.0.1"
+    server_ip: Optional[str] = None
+    server_port: int = 22
+    _tunnel: Optional["SSHTunnelForwarder"] = field(default=None, init=False)
+
+    def __post_init__(self):
+        if not self.server_ip:
+            self.server_ip = self.host_ip
 
     def start(self):
         """Start the SSH tunnel.
         """
         # Create SSH tunnel
-        if self._tunnel is None:
-            logger.debug(f"Creating tunnel: {str(self)}")
-            self._tunnel = SSHTunnelForwarder(
+        tunnel = self._tunnel
+        if tunnel is None:
+            from sshtunnel import SSHTunnelForwarder
+
+            logger.debug("Creating tunnel: %s", self)
+            tunnel = self._tunnel = SSHTunnelForwarder(
                 ssh_address_or_host=(self.server_ip, self.server_port),
                 remote_bind_address=(self.host_ip, self.host_port),
                 local_bind_address=(self.local_ip, self.local_port),
@@ -68,52 +85,45 @@ class SSHTunnel:
             )
         
         # Start the tunnel
-        if not self.is_active():
-            logger.debug(f"Starting tunnel: {str(self)}")
-            self._tunnel.start()
+        if not tunnel.is_active:
+            logger.debug("Starting tunnel: %s", self)
+            tunnel.start()
         
-        logger.info(f"Tunnel started: {str(self)}")
+        logger.info("Tunnel started: %s", self)
 
     def stop(self):
         """Stop the SSH tunnel.
         """
-        logger.debug(f"Stopping tunnel: {str(self)}")
-        if self.is_active():
-            self._tunnel.stop(force=True)
+        logger.debug("Stopping tunnel: %s", self)
+        tunnel = self._tunnel
+        if tunnel is not None and tunnel.is_active:
+            tunnel.stop(force=True)
         self._tunnel = None
-        logger.info(f"Tunnel stopped {str(self)}")
+        logger.info("Tunnel stopped %s", self)
 
     def is_active(self) -> bool:
-        if self._tunnel is None:
-            return False
-        return self._tunnel.is_active
+        # Read the forwarder once, stop() may clear it from another thread
+        tunnel = self._tunnel
+        return tunnel is not None and tunnel.is_active
 
     def __str__(self) -> str:
+        active = self.is_active()
         return (
             f"{self.name}: {self.local_ip}:{self.local_port} -> "
             f"{self.host_ip}:{self.host_port} ~ "
             f"{self.user}@{self.server_ip}:{self.server_port} | "
-            f"active: {self.is_active()}"
+            f"active: {active}"
         )
 
     def to_dict(self) -> dict:
-        return {
-            "name": self.name,
-            "local_ip": self.local_ip,
-            "local_port": self.local_port,
-            "host_ip": self.host_ip,
-            "host_port": self.host_port,
-            "server_port": self.server_port,
-            "user": self.user,
-            "password": self.password,
-            "server_ip": self.server_ip
-        }
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
 
 
 def save_tunnels(
     tunnels: List[SSHTunnel],
     path: Path,
     password: str,
+    salt: bytes = None,
 ):
     """Save a list of tunnels to an encrypted JSON.
 
@@ -121,12 +131,16 @@ def save_tunnels(
         tunnels (List[SSHTunnel]): List of SSHTunnel objects.
         path (Path): Path to the output file.
         password (str): Password to encrypt the data.
+        salt (bytes, optional): Salt used to derive the encryption key. If
+            None, a random one is generated. Defaults to None.
     """
-    logger.debug(f"Saving tunnels to {path}")
+    from .encryption import encrypt
+
+    logger.debug("Saving tunnels to %s", path)
     data = [t.to_dict() for t in tunnels]
-    json_str = json.dumps(data)
-    json_enc = encrypt(json_str, password)
-    path.write_text(json_enc)
+    json_bytes = _json_dumps(data)
+    json_enc = encrypt(json_bytes, password, salt)
+    path.write_bytes(json_enc)
 
 
 def load_tunnels(
@@ -142,8 +156,10 @@ def load_tunnels(
     Returns:
         List[SSHTunnel]: A list of SSHTunnel objects.
     """
-    logger.debug(f"Loading tunnels from {path}")
-    data = path.read_text()
+    from .encryption import decrypt
+
+    logger.debug("Loading tunnels from %s", path)
+    data = path.read_bytes()
     data = decrypt(data, password)
-    data = json.loads(data)
+    data = _json_loads(data)
     return [SSHTunnel(**d) for d in data]
@@ -1,85 +1,196 @@
 import base64
+import functools
 import os
+import string
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+# The cryptography modules are imported inside the functions, so that
+# importing this module does not slow down the start of the application
 
+# Key derivation functions
+KDF_PBKDF2 = 0
+KDF_SCRYPT = 1
 
-def derive_key(password: str, salt: bytes, length: int = 32) -> bytes:
-    """Derive a fixed-length key from a password using PBKDF2HMAC.
+# Formats of the encrypted data. The format is stored as the first byte of
+# the data. Data encrypted by older versions has no header and always uses
+# PBKDF2 and AES-CBC.
+FORMAT_SCRYPT_CBC = 1
+FORMAT_SCRYPT_GCM = 2
+
+_AES_BLOCK_BYTES = 16
+
+# Older versions saved the data as base64 text. The format headers are not
+# part of the base64 alphabet, so the first byte tells both apart.
+_BASE64_ALPHABET = frozenset(
+    (string.ascii_letters + string.digits + "+/").encode()
+)
+
+
+def derive_key(
+    password: str,
+    salt: bytes,
+    length: int = 32,
+    kdf: int = KDF_SCRYPT
+) -> bytes:
+    """Derive a fixed-length key from a password.
 
     Args:
         password (str): The password from which to derive the key.
         salt (bytes): A random salt to make the key derivation more secure.
         length (int): The length of the desired key in bytes.
             Default is 32 bytes (256 bits).
+        kdf (int): The key derivation function to use, KDF_SCRYPT or
+            KDF_PBKDF2. Defaults to KDF_SCRYPT.
 
     Returns:
         bytes: The derived key of the specified length.
     """
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=length,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend(),
-    )
-    return kdf.derive(password.encode())
+    if kdf == KDF_SCRYPT:
+        from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+        key_derivation = Scrypt(
+            salt=salt,
+            length=length,
+            n=2**15,
+            r=8,
+            p=1,
+        )
+    elif kdf == KDF_PBKDF2:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+        key_derivation = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=length,
+            salt=salt,
+            iterations=100000,
+        )
+    else:
+        raise ValueError(f"Unknown key derivation function: {kdf}")
+    return key_derivation.derive(password.encode())
+
+
+@functools.lru_cache(maxsize=8)
+def _derive_key_cached(password: str, salt: bytes, kdf: int) -> bytes:
+    return derive_key(password, salt, kdf=kdf)
+
+
+def clear_key_cache():
+    """Forget the keys derived during this session.
+    """
+    _derive_key_cached.cache_clear()
 
 
-def encrypt(message: str, password: str) -> str:
+def new_salt() -> bytes:
+    """Generate a random 16-byte salt.
+    """
+    return os.urandom(16)
+
+
+def encrypt(message: bytes, password: str, salt: bytes = None) -> bytes:
     """Encrypts a message using AES encryption and a password.
 
-    The password is used to derive a key, and the message is padded and
-    encrypted with AES in CBC mode. A random salt and IV are used, and the
-    result is returned as a base64-encoded string.
+    The password is used to derive a key with scrypt, and the message is
+    encrypted and authenticated with AES in GCM mode. A random salt and nonce
+    are used, and the result is returned as raw bytes.
+
+    The derived keys are cached, so encrypting again with the same password
+    and salt skips the key derivation.
 
     Args:
-        message (str): The plaintext message to encrypt.
+        message (bytes): The plaintext message to encrypt.
         password (str): The password used to derive the encryption key.
+        salt (bytes, optional): The 16-byte salt used to derive the key. If
+            None, a random one is generated. Defaults to None.
 
     Returns:
-        str: The base64-encoded ciphertext including the salt and IV.
+        bytes: The ciphertext including the format header, the salt, the
+            nonce and the authentication tag.
     """
-    salt = os.urandom(16)# Generate a random 16-byte salt
-    key = derive_key(password, salt)  # Derive a 256-bit key from the password
-    iv = os.urandom(16)  # Generate a random 16-byte IV for AES
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-    # Pad the message to a multiple of the AES block size (128 bits)
-    padder = padding.PKCS7(algorithms.AES.block_size).padder()
-    padded_message = padder.update(message.encode()) + padder.finalize()
+    if salt is None:
+        salt = new_salt()
+    key = _derive_key_cached(password, salt, KDF_SCRYPT)  # 256-bit key
+    nonce = os.urandom(12)  # Generate a random 12-byte nonce for AES-GCM
 
-    # Encrypt the padded message using AES-CBC
-    cipher = Cipher(
-        algorithms.AES(key),
-        modes.CBC(iv),
-        backend=default_backend()
-    )
-    encryptor = cipher.encryptor()
-    ciphertext = encryptor.update(padded_message) + encryptor.finalize()
+    # Encrypt the message using AES-GCM, the tag is appended to the ciphertext
+    ciphertext = AESGCM(key).encrypt(nonce, message, None)
 
-    # Return the salt, IV, and ciphertext as a base64-encoded string
-    return base64.b64encode(salt + iv + ciphertext).decode()
+    # Return the header, salt, nonce, and ciphertext
+    header = bytes([FORMAT_SCRYPT_GCM])
+    return header + salt + nonce + ciphertext
 
 
-def decrypt(encrypted_message: str, password: str) -> str:
-    """Decrypt a base64-encoded AES-encrypted message using a password.
+def decrypt(encrypted_message: bytes, password: str) -> bytes:
+    """Decrypt an AES-encrypted message using a password.
 
-    The salt and IV are extracted from the encrypted message, and the password
-    is used to derive the decryption key. The message is then decrypted and
-    unpadded to retrieve the original plaintext.
+    The format header, salt and nonce (or IV) are extracted from the
+    encrypted message, and the password is used to derive the decryption key.
+    The message is then decrypted to retrieve the original plaintext.
+
+    Messages saved by older versions are base64-encoded, and may not have a
+    format header. Those are recognized by their length: the salt, IV and
+    padded ciphertext are all multiples of the AES block size, while the
+    header breaks that alignment.
 
     Args:
-        encrypted_message (str): The base64-encoded encrypted message,
-            containing the salt, IV, and ciphertext.
+        encrypted_message (bytes): The encrypted message, containing the
+            format header, salt, nonce, and ciphertext.
         password (str): The password used to derive the decryption key.
 
+    Raises:
+        ValueError: If the password is wrong or the data is corrupted.
+
     Returns:
-        str: The decrypted plaintext message.
+        bytes: The decrypted plaintext message.
     """
-    encrypted_data = base64.b64decode(encrypted_message)
+    from cryptography.exceptions import InvalidTag
+
+    if not encrypted_message:
+        raise ValueError("No data to decrypt")
+
+    if encrypted_message[0] in _BASE64_ALPHABET:
+        encrypted_data = base64.b64decode(encrypted_message)
+        is_legacy = len(encrypted_data) % _AES_BLOCK_BYTES == 0
+    else:
+        encrypted_data = encrypted_message
+        is_legacy = False
+
+    header = encrypted_data[0]
+    if header == FORMAT_SCRYPT_GCM:
+        try:
+            return _decrypt_gcm(encrypted_data[1:], password)
+        except InvalidTag:
+            # A legacy message may start with the same byte by chance
+            if not is_legacy:
+                raise ValueError("Wrong password or corrupted data")
+    if is_legacy:
+        return _decrypt_cbc(encrypted_data, password, KDF_PBKDF2)
+    if header == FORMAT_SCRYPT_CBC:
+        return _decrypt_cbc(encrypted_data[1:], password, KDF_SCRYPT)
+    raise ValueError(f"Unknown encryption format: {header}")
+
+
+def _decrypt_gcm(encrypted_data: bytes, password: str) -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    # Extract the salt (first 16 bytes), nonce (next 12 bytes),
+    # and ciphertext with the tag (the rest)
+    salt = encrypted_data[:16]
+    nonce = encrypted_data[16:28]
+    ciphertext = encrypted_data[28:]
+
+    # Derive the key using the same salt
+    key = _derive_key_cached(password, salt, KDF_SCRYPT)
+
+    # Decrypt and authenticate the ciphertext using AES-GCM
+    return AESGCM(key).decrypt(nonce, ciphertext, None)
+
+
+def _decrypt_cbc(encrypted_data: bytes, password: str, kdf: int) -> bytes:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import (Cipher, algorithms,
+                                                        modes)
 
     # Extract the salt (first 16 bytes), IV (next 16 bytes),
     # and ciphertext (the rest)
@@ -88,15 +199,13 @@ def decrypt(encrypted_message: str, password: str) -> str:
     ciphertext = encrypted_data[32:]
 
     # Derive the key using the same salt
-    key = derive_key(password, salt)
+    key = _derive_key_cached(password, salt, kdf)
 
     # Decrypt the ciphertext using AES-CBC
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+    cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
     decryptor = cipher.decryptor()
     padded_message = decryptor.update(ciphertext) + decryptor.finalize()
 
     # Unpad the decrypted message to retrieve the original plaintext
     unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
-    message = unpadder.update(padded_message) + unpadder.finalize()
-
-    return message.decode()
+    return unpadder.update(padded_message) + unpadder.finalize()